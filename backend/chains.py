@@ -2,32 +2,47 @@
 # Defines functions to answer questions using a language model with document context and conversation history, 
 # summarize text into bullet points, and translate text to a specified language.
 
+from functools import lru_cache
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.messages import AIMessage
 from backend.config import MODEL, QA_TEMPLATE, SUMMARY_TEMPLATE, TRANSLATION_TEMPLATE
 
+# Prompt | model pipelines are built once at import time and reused per call
+QA_CHAIN = ChatPromptTemplate.from_template(QA_TEMPLATE) | MODEL
+SUMMARY_CHAIN = ChatPromptTemplate.from_template(SUMMARY_TEMPLATE) | MODEL
+TRANSLATION_CHAIN = ChatPromptTemplate.from_template(TRANSLATION_TEMPLATE) | MODEL
+
 def answer_question(question, documents, memory):
+    # Only reads the memory; the caller records the exchange once it has a response
     context = "\n\n".join([doc.page_content for doc in documents])
-    prompt = ChatPromptTemplate.from_template(QA_TEMPLATE)
-    chain = prompt | MODEL
-    
-    response = chain.invoke({
+    response = QA_CHAIN.invoke({
         "question": question,
         "context": context,
         "history": memory.load_memory_variables({})['history']
     })
-    
-    memory.save_context({"input": question}, {"output": response.content})
     return response.content
 
+async def stream_answer(question, documents, memory):
+    # Same prompt as answer_question, yielding the answer text as it is generated
+    context = "\n\n".join([doc.page_content for doc in documents])
+    async for chunk in QA_CHAIN.astream({
+        "question": question,
+        "context": context,
+        "history": memory.load_memory_variables({})['history']
+    }):
+        yield chunk.content
+
 def summarize_text(text):
-    prompt = ChatPromptTemplate.from_template(SUMMARY_TEMPLATE)
-    chain = prompt | MODEL
-    result = chain.invoke({"text": text})
-    return result.content
+    return SUMMARY_CHAIN.invoke({"text": text}).content
 
 def translate_text(text, target_language="Hindi"):
-    prompt = ChatPromptTemplate.from_template(TRANSLATION_TEMPLATE)
-    chain = prompt | MODEL
-    result = chain.invoke({"text": text, "target_language": target_language})
-    return result.content
\ No newline at end of file
+    return TRANSLATION_CHAIN.invoke({"text": text, "target_language": target_language}).content
+
+@lru_cache(maxsize=32)
+def summarize_documents(summaries):
+    # summaries is a tuple of chunk summaries, so repeat requests hit the cache
+    return summarize_text("\n\n".join(summaries))
+
+@lru_cache(maxsize=32)
+def translate_documents(summaries, target_language):
+    return translate_text("\n\n".join(summaries), target_language)
\ No newline at end of file
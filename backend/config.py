@@ -1,22 +1,42 @@
 # backend/config.py
-# Loads environment variables, sets up directories, initializes Google Generative AI embeddings and chat model, 
+# Loads environment variables, sets up directories, initializes (disk-cached) Google Generative AI embeddings and chat model, 
 # and defines prompt templates for QA, summarization, and translation.
 
 import os
 from dotenv import load_dotenv
-from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
 
 load_dotenv()
 
+# Pin OpenMP/BLAS threading before numpy/faiss are imported (they read these on load):
+# split the cores across Uvicorn workers and let idle OpenMP threads sleep instead of spin
+UVICORN_WORKERS = int(os.getenv("UVICORN_WORKERS", "1"))
+os.environ.setdefault("OMP_WAIT_POLICY", "PASSIVE")
+for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(var, str(max(1, (os.cpu_count() or 1) // UVICORN_WORKERS)))
+
+from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
+from langchain.embeddings import CacheBackedEmbeddings
+from langchain.storage import LocalFileStore
+
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 PDFS_DIRECTORY = os.getenv("PDFS_DIRECTORY")
 FAISS_INDEX_DIRECTORY = os.getenv("FAISS_INDEX_DIRECTORY")
 DATABASE_URL = os.getenv("DATABASE_URL")
+EMBEDDING_CACHE_DIRECTORY = os.getenv("EMBEDDING_CACHE_DIRECTORY", "./embedding_cache")
+URL_CACHE_PATH = os.getenv("URL_CACHE_PATH", "./url_cache")
 
 os.makedirs(PDFS_DIRECTORY, exist_ok=True)
 os.makedirs(FAISS_INDEX_DIRECTORY, exist_ok=True)
-
-EMBEDDINGS = GoogleGenerativeAIEmbeddings(model="models/embedding-001", google_api_key=GOOGLE_API_KEY)
+os.makedirs(EMBEDDING_CACHE_DIRECTORY, exist_ok=True)
+
+# Document embeddings are cached on disk keyed by a hash of the chunk text,
+# so re-indexing previously seen content doesn't call the API again.
+_BASE_EMBEDDINGS = GoogleGenerativeAIEmbeddings(model="models/embedding-001", google_api_key=GOOGLE_API_KEY)
+EMBEDDINGS = CacheBackedEmbeddings.from_bytes_store(
+    _BASE_EMBEDDINGS,
+    LocalFileStore(EMBEDDING_CACHE_DIRECTORY),
+    namespace="embedding-001"
+)
 MODEL = ChatGoogleGenerativeAI(model="gemini-2.5-pro", google_api_key=GOOGLE_API_KEY, temperature=0.4)
 
 QA_TEMPLATE = """
@@ -1,30 +1,91 @@
 # backend/document_processor.py
-# Handles PDF uploads, URL scraping, text splitting into chunks, 
-# and indexing documents into a FAISS vector store for retrieval, with error logging and retries.
+# Handles PDF uploads (text extracted with PDFium), URL scraping, text splitting into chunks, 
+# and indexing documents into a FAISS vector store (persisted to disk) for retrieval, with error logging and retries.
 
 import os
+import json
+import pickle
+import shutil
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from backend.config import PDFS_DIRECTORY, FAISS_INDEX_DIRECTORY, URL_CACHE_PATH, EMBEDDINGS  # before faiss: sets thread env vars
 from langchain_community.document_loaders import PDFPlumberLoader, WebBaseLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 from langchain_community.vectorstores import FAISS  # Updated import
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores.utils import DistanceStrategy
+import faiss
+import numpy as np
+import requests_cache
 from tenacity import retry, stop_after_attempt, wait_exponential
 import logging
-from backend.config import PDFS_DIRECTORY, EMBEDDINGS
+from backend.chains import summarize_text
+from backend.pdf_extract import extract_pages
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+faiss.omp_set_num_threads(int(os.environ["OMP_NUM_THREADS"]))
+
+# Chunks per embedding request, and how many requests may be in flight at once
+EMBEDDING_BATCH_SIZE = 100
+EMBEDDING_WORKERS = 4
+
+# HNSW graph parameters: neighbours per node and search/construction breadth
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 64
+
+# Scraped pages are cached on disk for a day (revalidated with ETag/Last-Modified when sent)
+URL_SESSION = requests_cache.CachedSession(URL_CACHE_PATH, expire_after=86400, cache_control=True)
+
+# Chunks are sized in tokens (not characters) to match what the embedding model sees.
+# Small child chunks are embedded for precise retrieval; the larger parent chunk
+# they came from is what gets passed to the LLM.
+PARENT_SPLITTER = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+    chunk_size=1500,
+    chunk_overlap=100,
+    add_start_index=True
+)
+CHILD_SPLITTER = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+    chunk_size=256,
+    chunk_overlap=32,
+    add_start_index=True
+)
+PARENTS_FILE = os.path.join(FAISS_INDEX_DIRECTORY, "parents.pkl")
+
+# Parent chunks keyed by the parent_id stamped on their children's metadata
+PARENT_DOCUMENTS = {}
+
+# Chunks summarized together at index time, and parallel summary requests
+SUMMARY_GROUP_SIZE = 10
+SUMMARY_WORKERS = 4
+SUMMARIES_FILE = os.path.join(FAISS_INDEX_DIRECTORY, "summaries.json")
+
+# Summaries of the indexed chunks, used by the summarize/translate queries
+# instead of re-reading the whole corpus (mutated in place, never reassigned)
+DOC_SUMMARIES = []
+
 def upload_pdf(file):
     file_path = os.path.join(PDFS_DIRECTORY, file.filename)
     with open(file_path, "wb") as f:
-        f.write(file.file.read())
+        # Copy in 1 MiB blocks so large PDFs are never held in memory whole
+        shutil.copyfileobj(file.file, f, length=1 << 20)
     return file_path
 
 def load_pdf(file_path):
     try:
-        loader = PDFPlumberLoader(file_path)
-        documents = loader.load()
+        pages = extract_pages(file_path)
+        documents = [
+            Document(page_content=text, metadata={"source": file_path, "page": i, "total_pages": len(pages)})
+            for i, text in enumerate(pages)
+        ]
+        if not any(doc.page_content.strip() for doc in documents):
+            # No text layer found by PDFium (e.g. scanned PDFs); try PDFPlumber instead
+            logger.info(f"PDFium extracted no text from {file_path}, falling back to PDFPlumber")
+            documents = PDFPlumberLoader(file_path).load()
         if not documents:
             logger.error(f"No content extracted from PDF: {file_path}")
             return []
@@ -36,7 +97,12 @@ def load_pdf(file_path):
 @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
 def scrape_url(url: str):
     try:
-        loader = WebBaseLoader(url, requests_kwargs={"timeout": 10, "headers": {"User-Agent": os.getenv("USER_AGENT", "LangChain-WebBaseLoader")}})
+        loader = WebBaseLoader(
+            url,
+            requests_kwargs={"timeout": 10, "headers": {"User-Agent": os.getenv("USER_AGENT", "LangChain-WebBaseLoader")}},
+            default_parser="lxml",
+            session=URL_SESSION
+        )
         documents = loader.load()
         if documents:
             cleaned_text = " ".join(doc.page_content.strip() for doc in documents if doc.page_content)
@@ -49,25 +115,126 @@ def scrape_url(url: str):
         return []
 
 def split_text(documents):
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=2000,
-        chunk_overlap=200,
-        add_start_index=True
-    )
-    return text_splitter.split_documents(documents)
-
-def index_docs(documents, vector_store=None):
+    # Returns the child chunks to embed and their parents keyed by parent_id; the
+    # parents are only registered in PARENT_DOCUMENTS once the children are indexed
+    children = []
+    parents = {}
+    for parent in PARENT_SPLITTER.split_documents(documents):
+        parent_id = uuid.uuid4().hex
+        parents[parent_id] = parent
+        for child in CHILD_SPLITTER.split_documents([parent]):
+            child.metadata["parent_id"] = parent_id
+            children.append(child)
+    return children, parents
+
+def embed_texts(texts):
+    batches = [texts[i:i + EMBEDDING_BATCH_SIZE] for i in range(0, len(texts), EMBEDDING_BATCH_SIZE)]
+    with ThreadPoolExecutor(max_workers=EMBEDDING_WORKERS) as executor:
+        results = executor.map(EMBEDDINGS.embed_documents, batches)
+    return [vector for batch in results for vector in batch]
+
+def build_index(dimension):
+    # HNSW gives sub-linear search and supports incremental adds; vectors are
+    # stored as FP16 (half the memory of FP32). FP16 needs no data-dependent range,
+    # unlike 8-bit codes, which would have to be trained on whatever the first upload
+    # contains. Vectors are unit length, so inner product is cosine similarity.
+    index = faiss.IndexHNSWSQ(dimension, faiss.ScalarQuantizer.QT_fp16, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+    index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    index.hnsw.efSearch = HNSW_EF_SEARCH
+    return index
+
+@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
+def summarize_group(text):
+    return summarize_text(text)
+
+def summarize_group_or_text(text):
+    # A group that still fails after retries keeps its raw text, so the document
+    # stays covered by summarize/translate instead of silently dropping out
+    try:
+        return summarize_group(text)
+    except Exception as e:
+        logger.error(f"Failed to summarize chunk group, keeping its raw text: {str(e)}")
+        return text
+
+def summarize_chunks(documents):
+    groups = [
+        "\n\n".join(doc.page_content for doc in documents[i:i + SUMMARY_GROUP_SIZE])
+        for i in range(0, len(documents), SUMMARY_GROUP_SIZE)
+    ]
+    with ThreadPoolExecutor(max_workers=SUMMARY_WORKERS) as executor:
+        summaries = list(executor.map(summarize_group_or_text, groups))
+    logger.info(f"Summarized {len(documents)} chunks into {len(summaries)} summaries")
+    return summaries
+
+def prepare_chunks(documents):
+    # The slow API work (embeddings and summaries) for a batch of chunks; touches no
+    # shared state, so it can run without holding the vector store lock
+    if not documents:
+        return None, []
+    xb = np.asarray(embed_texts([doc.page_content for doc in documents]), dtype=np.float32)
+    faiss.normalize_L2(xb)
+    return xb, summarize_chunks(documents)
+
+def index_docs(documents, embeddings, summaries, vector_store=None, parents=None):
     if documents:
+        texts = [doc.page_content for doc in documents]
+        metadatas = [doc.metadata for doc in documents]
+        text_embeddings = list(zip(texts, embeddings))
         if vector_store is None:
-            vector_store = FAISS.from_documents(documents, EMBEDDINGS)
+            index = build_index(embeddings.shape[1])
+            vector_store = FAISS(
+                EMBEDDINGS, index, InMemoryDocstore(), {},
+                distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
+            )
+            vector_store.add_embeddings(text_embeddings, metadatas=metadatas)
             logger.info(f"Indexed new vector store with {len(documents)} chunks")
         else:
-            vector_store.add_documents(documents)
+            vector_store.add_embeddings(text_embeddings, metadatas=metadatas)
             logger.info(f"Added {len(documents)} chunks to existing vector store")
+        PARENT_DOCUMENTS.update(parents or {})
+        DOC_SUMMARIES.extend(summaries)
     else:
         logger.warning("No documents to index")
     return vector_store
 
+def save_vector_store(vector_store):
+    if vector_store is not None:
+        vector_store.save_local(FAISS_INDEX_DIRECTORY)
+        with open(SUMMARIES_FILE, "w", encoding="utf-8") as f:
+            json.dump(DOC_SUMMARIES, f)
+        with open(PARENTS_FILE, "wb") as f:
+            pickle.dump(PARENT_DOCUMENTS, f)
+        logger.info(f"Saved vector store to {FAISS_INDEX_DIRECTORY}")
+
+def load_vector_store():
+    if not os.path.exists(os.path.join(FAISS_INDEX_DIRECTORY, "index.faiss")):
+        logger.info("No saved vector store found")
+        return None
+    try:
+        vector_store = FAISS.load_local(
+            FAISS_INDEX_DIRECTORY,
+            EMBEDDINGS,
+            allow_dangerous_deserialization=True,
+            distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
+        )
+        if os.path.exists(SUMMARIES_FILE):
+            with open(SUMMARIES_FILE, encoding="utf-8") as f:
+                DOC_SUMMARIES[:] = json.load(f)
+        if os.path.exists(PARENTS_FILE):
+            with open(PARENTS_FILE, "rb") as f:
+                PARENT_DOCUMENTS.update(pickle.load(f))
+        logger.info(f"Loaded vector store with {vector_store.index.ntotal} chunks from {FAISS_INDEX_DIRECTORY}")
+        return vector_store
+    except Exception as e:
+        logger.error(f"Failed to load vector store from {FAISS_INDEX_DIRECTORY}: {str(e)}")
+        return None
+
 def clear_vector_store(vector_store=None):
+    DOC_SUMMARIES.clear()
+    PARENT_DOCUMENTS.clear()
+    for name in ("index.faiss", "index.pkl", "summaries.json", "parents.pkl"):
+        path = os.path.join(FAISS_INDEX_DIRECTORY, name)
+        if os.path.exists(path):
+            os.remove(path)
     logger.info("Vector store cleared")
     return None
\ No newline at end of file
@@ -3,16 +3,23 @@
 # answering queries (with summarization/translation), managing conversation history, and clearing documents/memory.
 
 from fastapi import FastAPI, Depends, HTTPException, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
-from backend.document_processor import upload_pdf, load_pdf, scrape_url, split_text, index_docs, clear_vector_store
-from backend.chains import answer_question, summarize_text, translate_text
-from backend.retrievers import retrieve_docs, hybrid_retrieval
-from backend.models import SessionLocal, Conversation
+from typing import Dict, List
+from backend.config import PDFS_DIRECTORY  # first backend import: pins OpenMP/BLAS threads
+from backend.document_processor import upload_pdf, load_pdf, scrape_url, split_text, prepare_chunks, index_docs, save_vector_store, load_vector_store, clear_vector_store, DOC_SUMMARIES
+from backend.chains import answer_question, stream_answer, summarize_documents, translate_documents
+from backend.retrievers import retrieve_docs, hybrid_retrieval, reset_bm25_cache
+from backend.models import SessionLocal, Conversation, engine
+from backend.pdf_extract import shutdown_executor
 from backend.schemas import QueryRequest, ConversationResponse, Message, ScrapeUrlRequest
 from backend.crud import save_message, get_conversations
-from backend.config import PDFS_DIRECTORY
 from langchain.memory import ConversationBufferWindowMemory
+import anyio
+import asyncio
+from contextlib import asynccontextmanager
+import json
 import logging
 
 # Set up logging
@@ -21,6 +28,18 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI()
 
+# Blocking work (parsing, embeddings, LLM calls, DB) runs in the threadpool
+THREADPOOL_SIZE = 64
+
+@app.on_event("startup")
+async def configure_threadpool():
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+
+@app.on_event("shutdown")
+async def release_resources():
+    engine.dispose()
+    shutdown_executor()
+
 # Dependency to get DB session
 def get_db():
     db = SessionLocal()
@@ -29,18 +48,69 @@ def get_db():
     finally:
         db.close()
 
-# Global vector store and memory
+class StoreLock:
+    """Readers-writer lock: queries search the vector store concurrently, while
+    indexing and clearing wait for them to finish and then run exclusively.
+    A waiting writer holds off new readers so steady query traffic can't starve it."""
+
+    def __init__(self):
+        self._readers = 0
+        self._writers_waiting = 0
+        self._condition = asyncio.Condition()
+
+    @asynccontextmanager
+    async def read(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._writers_waiting == 0)
+            self._readers += 1
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self._readers -= 1
+                self._condition.notify_all()
+
+    @asynccontextmanager
+    async def write(self):
+        # Holding the condition's lock keeps new readers and writers out
+        async with self._condition:
+            self._writers_waiting += 1
+            try:
+                await self._condition.wait_for(lambda: self._readers == 0)
+            finally:
+                self._writers_waiting -= 1
+            try:
+                yield
+            finally:
+                self._condition.notify_all()
+
+# Global vector store and per-user conversation memory
 vector_store = None
-memory = ConversationBufferWindowMemory(k=3)
+store_lock = StoreLock()
+memory_map: Dict[str, ConversationBufferWindowMemory] = {}
+
+def get_memory(user_id):
+    if user_id not in memory_map:
+        memory_map[user_id] = ConversationBufferWindowMemory(k=3)
+    return memory_map[user_id]
+
+@app.on_event("startup")
+async def load_saved_vector_store():
+    global vector_store
+    vector_store = await run_in_threadpool(load_vector_store)
 
 @app.post("/upload_pdf")
 async def upload_pdf_endpoint(file: UploadFile = File(...)):
     global vector_store
     try:
-        file_path = upload_pdf(file)
-        documents = load_pdf(file_path)
-        chunked_documents = split_text(documents)
-        vector_store = index_docs(chunked_documents, vector_store)
+        file_path = await run_in_threadpool(upload_pdf, file)
+        documents = await run_in_threadpool(load_pdf, file_path)
+        chunked_documents, parents = await run_in_threadpool(split_text, documents)
+        # Embed and summarize before taking the write lock so queries aren't blocked on API calls
+        embeddings, summaries = await run_in_threadpool(prepare_chunks, chunked_documents)
+        async with store_lock.write():
+            vector_store = await run_in_threadpool(index_docs, chunked_documents, embeddings, summaries, vector_store, parents)
+            await run_in_threadpool(save_vector_store, vector_store)
         logger.info(f"PDF {file.filename} processed successfully")
         return {"message": "PDF processed successfully"}
     except Exception as e:
@@ -51,70 +121,90 @@ async def upload_pdf_endpoint(file: UploadFile = File(...)):
 async def scrape_url_endpoint(request: ScrapeUrlRequest):
     global vector_store
     try:
-        documents = scrape_url(request.url)
+        documents = await run_in_threadpool(scrape_url, request.url)
         if not documents:
             raise HTTPException(status_code=400, detail="Failed to scrape URL")
-        chunked_documents = split_text(documents)
-        vector_store = index_docs(chunked_documents, vector_store)
+        chunked_documents, parents = await run_in_threadpool(split_text, documents)
+        # Embed and summarize before taking the write lock so queries aren't blocked on API calls
+        embeddings, summaries = await run_in_threadpool(prepare_chunks, chunked_documents)
+        async with store_lock.write():
+            vector_store = await run_in_threadpool(index_docs, chunked_documents, embeddings, summaries, vector_store, parents)
+            await run_in_threadpool(save_vector_store, vector_store)
         logger.info(f"URL {request.url} processed successfully")
         return {"message": "URL processed successfully"}
     except Exception as e:
         logger.error(f"Error scraping URL: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to scrape URL: {str(e)}")
 
+async def document_task_response(request: QueryRequest):
+    """Answer a summarize/translate request from the indexed document summaries."""
+    if request.mode == "summarize":
+        if not vector_store or not DOC_SUMMARIES:
+            return "No documents available to summarize."
+        return await run_in_threadpool(summarize_documents, tuple(DOC_SUMMARIES))
+    target_lang = request.target_language or "French"
+    if not vector_store or not DOC_SUMMARIES:
+        return "No documents available to translate."
+    return await run_in_threadpool(translate_documents, tuple(DOC_SUMMARIES), target_lang)
+
+async def retrieve_sources(question, search_mode):
+    """Retrieve documents for a QA query; returns them with their source_documents payload."""
+    retriever = hybrid_retrieval if search_mode == "Hybrid" else retrieve_docs
+    async with store_lock.read():
+        related_documents = await run_in_threadpool(retriever, question, vector_store)
+    source_documents = [
+        {"content": doc.page_content[:300], "metadata": doc.metadata}
+        for doc in related_documents
+    ]
+    return related_documents, source_documents
+
 @app.post("/query", response_model=ConversationResponse)
 async def query_endpoint(request: QueryRequest, db: Session = Depends(get_db)):
-    global vector_store, memory
     question = request.question
     user_id = request.user_id
     search_mode = request.search_mode
+    mode = request.mode
+    memory = get_memory(user_id)
+
+    logger.info(f"Received query: {question} (user_id: {user_id}, mode: {mode}, search_mode: {search_mode})")
 
-    logger.info(f"Received query: {question} (user_id: {user_id}, search_mode: {search_mode})")
+    # Load recent history now; the two new messages are prepended to it later
+    # instead of re-querying after the writes (copied out, as commits expire ORM rows)
+    history = [
+        (conv.role, conv.content)
+        for conv in await run_in_threadpool(get_conversations, db, user_id, 8)
+    ]
 
     # Save user message
     save_message(db, user_id, "user", question)
 
     try:
         source_documents = []
-        if question.lower() == "summarize":
-            if not vector_store:
-                response = "No documents available to summarize."
-            else:
-                all_text = "\n\n".join([doc.page_content for doc in vector_store.docstore._dict.values()])
-                response = summarize_text(all_text)
-        elif question.lower().startswith("translate:"):
-            target_lang = question.split(":", 1)[1].strip() if ":" in question else "French"
-            if not vector_store:
-                response = "No documents available to translate."
-            else:
-                all_text = "\n\n".join([doc.page_content for doc in vector_store.docstore._dict.values()])
-                response = translate_text(all_text, target_lang)
+        if mode in ("summarize", "translate"):
+            response = await document_task_response(request)
         else:
-            related_documents = hybrid_retrieval(question, vector_store) if search_mode == "Hybrid" else retrieve_docs(question, vector_store)
-            source_documents = [
-                {"content": doc.page_content[:300], "metadata": doc.metadata}
-                for doc in related_documents
-            ]
+            related_documents, source_documents = await retrieve_sources(question, search_mode)
             if not related_documents:
                 response = "I couldn't find relevant information in the provided sources."
             else:
-                response = answer_question(question, related_documents, memory)
+                response = await run_in_threadpool(answer_question, question, related_documents, memory)
         logger.info(f"Generated response: {response[:100]}...")
 
-        # Save assistant response
+        # Save assistant response and commit both messages in one transaction
         save_message(db, user_id, "assistant", response)
+        await run_in_threadpool(db.commit)
 
         # Update memory
         memory.save_context({"input": question}, {"output": response})
 
-        # Get recent conversations
-        conversations = get_conversations(db, user_id)
+        # Recent conversations, newest first
+        conversations = [("assistant", response), ("user", question)] + history
         messages = [
             Message(
-                role=conv.role,
-                content=conv.content,
-                source_documents=source_documents if conv.role == "assistant" and source_documents else []
-            ) for conv in conversations
+                role=role,
+                content=content,
+                source_documents=source_documents if role == "assistant" and source_documents else []
+            ) for role, content in conversations
         ]
         logger.info(f"Returning {len(messages)} messages")
         return ConversationResponse(messages=messages)
@@ -123,8 +213,65 @@ async def query_endpoint(request: QueryRequest, db: Session = Depends(get_db)):
         logger.error(f"Error processing query: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to process query: {str(e)}")
 
+def sse_event(payload, event=None):
+    # Payloads are JSON-encoded, which escapes every line-break character, so each
+    # event is always a single "data:" line whatever the token contains
+    lines = [f"event: {event}"] if event else []
+    lines.append(f"data: {json.dumps(payload, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+@app.post("/query_stream")
+async def query_stream_endpoint(request: QueryRequest):
+    """
+    Stream the response as server-sent events with JSON payloads: a "sources" event
+    for QA queries, then the answer text as it is generated, then "done" (or "error").
+    """
+    question = request.question
+    user_id = request.user_id
+    search_mode = request.search_mode
+    mode = request.mode
+    memory = get_memory(user_id)
+
+    logger.info(f"Received streaming query: {question} (user_id: {user_id}, mode: {mode}, search_mode: {search_mode})")
+
+    async def event_stream():
+        parts = []
+        try:
+            if mode in ("summarize", "translate"):
+                parts.append(await document_task_response(request))
+                yield sse_event(parts[0])
+            else:
+                related_documents, source_documents = await retrieve_sources(question, search_mode)
+                yield sse_event(source_documents, event="sources")
+                if not related_documents:
+                    parts.append("I couldn't find relevant information in the provided sources.")
+                    yield sse_event(parts[0])
+                else:
+                    async for token in stream_answer(question, related_documents, memory):
+                        parts.append(token)
+                        yield sse_event(token)
+            response = "".join(parts)
+            logger.info(f"Streamed response: {response[:100]}...")
+
+            # Persist only once the full answer exists. The request-scoped get_db
+            # session is already closed by the time the stream body runs.
+            db = SessionLocal()
+            try:
+                save_message(db, user_id, "user", question)
+                save_message(db, user_id, "assistant", response)
+                await run_in_threadpool(db.commit)
+            finally:
+                db.close()
+            memory.save_context({"input": question}, {"output": response})
+            yield sse_event("", event="done")
+        except Exception as e:
+            logger.error(f"Error streaming query: {str(e)}")
+            yield sse_event(f"Failed to process query: {str(e)}", event="error")
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
 @app.get("/history", response_model=ConversationResponse)
-async def history_endpoint(user_id: str, db: Session = Depends(get_db)):
+def history_endpoint(user_id: str, db: Session = Depends(get_db)):
     """Fetch conversation history without generating a response."""
     try:
         conversations = db.query(Conversation).filter(Conversation.user_id == user_id).order_by(Conversation.id.asc()).limit(10).all()
@@ -144,23 +291,23 @@ async def history_endpoint(user_id: str, db: Session = Depends(get_db)):
 @app.get("/clear_documents")
 async def clear_documents_endpoint():
     global vector_store
-    vector_store = clear_vector_store(vector_store)
+    async with store_lock.write():
+        vector_store = await run_in_threadpool(clear_vector_store, vector_store)
+        reset_bm25_cache()
     logger.info("Document cache cleared")
     return {"message": "Document cache cleared"}
 
 @app.get("/clear_memory")
 async def clear_memory_endpoint():
-    global memory
-    memory.clear()
+    memory_map.clear()
     logger.info("Conversation history cleared")
     return {"message": "Conversation history cleared"}
 
 @app.get("/clear_conversation")
-async def clear_conversation_endpoint(db: Session = Depends(get_db)):
-    global memory
+def clear_conversation_endpoint(db: Session = Depends(get_db)):
     try:
         # Clear in-memory conversation
-        memory.clear()
+        memory_map.pop("default_user", None)
         # Clear database conversations for the user
         db.query(Conversation).filter(Conversation.user_id == "default_user").delete()
         db.commit()
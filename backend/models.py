@@ -1,7 +1,7 @@
 # models
 # Defines the SQLAlchemy Conversation table for storing messages with user ID, role, and content, 
 # and sets up the database engine and session.
-from sqlalchemy import Column, Integer, String, Text, create_engine
+from sqlalchemy import Column, Index, Integer, String, Text, create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from backend.config import DATABASE_URL
@@ -11,10 +11,26 @@ Base = declarative_base()
 class Conversation(Base):
     __tablename__ = "conversations"
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(String, index=True)  # For multi-user support
+    user_id = Column(String)  # For multi-user support; indexed by ix_conversations_user_id_id
     role = Column(String)
     content = Column(Text)
 
-engine = create_engine(DATABASE_URL)
+    # Covers the per-user "latest N messages" lookup (filter by user_id, order by id)
+    __table_args__ = (Index("ix_conversations_user_id_id", "user_id", "id"),)
+
+# Pool sized for concurrent threadpool requests; pre-ping and recycle drop stale connections
+engine = create_engine(
+    DATABASE_URL,
+    pool_size=20,
+    max_overflow=40,
+    pool_pre_ping=True,
+    pool_recycle=1800
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base.metadata.create_all(bind=engine)
\ No newline at end of file
+Base.metadata.create_all(bind=engine)
+# create_all skips indexes on tables that already exist, so add any missing ones
+for index in Conversation.__table__.indexes:
+    index.create(bind=engine, checkfirst=True)
+# The single-column user_id index is superseded by the composite one
+with engine.begin() as conn:
+    conn.execute(text("DROP INDEX IF EXISTS ix_conversations_user_id"))
\ No newline at end of file
@@ -0,0 +1,75 @@
+# backend/pdf_extract.py
+# Extracts page text from PDFs with pypdfium2 (PDFium), splitting large files across worker processes.
+# Kept free of heavy imports so spawned workers start quickly.
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import pypdfium2 as pdfium
+
+# Pages per worker process; smaller PDFs are extracted in-process, where spawn overhead would dominate
+MIN_PAGES_FOR_WORKERS = 50
+# Shares the per-worker CPU budget that backend.config sets up for OpenMP/BLAS
+PDF_WORKERS = int(os.environ.get("OMP_NUM_THREADS", os.cpu_count() or 1))
+
+# PDFium is not thread-safe: every call made in this process (load_pdf runs in the
+# server threadpool) goes through this lock. Worker processes have their own PDFium.
+_PDFIUM_LOCK = threading.Lock()
+
+# One process pool for all requests, created on first use, so concurrent uploads
+# share PDF_WORKERS processes instead of each spawning their own
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # "spawn" avoids forking a process that already runs threadpool and OpenMP threads
+            _executor = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown()
+            _executor = None
+
+def _extract_page_range(file_path, start, stop):
+    pdf = pdfium.PdfDocument(file_path)
+    try:
+        texts = []
+        for i in range(start, stop):
+            page = pdf[i]
+            textpage = page.get_textpage()
+            texts.append(textpage.get_text_bounded())
+            textpage.close()
+            page.close()
+        return texts
+    finally:
+        pdf.close()
+
+def extract_pages(file_path):
+    """Return the text of every page in the PDF, in page order."""
+    with _PDFIUM_LOCK:
+        pdf = pdfium.PdfDocument(file_path)
+        page_count = len(pdf)
+        pdf.close()
+
+    workers = min(PDF_WORKERS, page_count // MIN_PAGES_FOR_WORKERS)
+    if workers <= 1:
+        with _PDFIUM_LOCK:
+            return _extract_page_range(file_path, 0, page_count)
+
+    # One contiguous page range per worker, so each process opens the file once
+    step = -(-page_count // workers)
+    ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+    results = _get_executor().map(
+        _extract_page_range,
+        [file_path] * len(ranges),
+        [start for start, _ in ranges],
+        [stop for _, stop in ranges]
+    )
+    return [text for texts in results for text in texts]
@@ -4,12 +4,76 @@
 from langchain_community.retrievers import BM25Retriever  # Updated import
 from langchain.retrievers import EnsembleRetriever
 from langchain_core.documents import Document
+from backend.config import EMBEDDINGS
+from backend.document_processor import PARENT_DOCUMENTS
+import faiss
+import numpy as np
 import logging
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# BM25 retriever built over the current vector store's documents. The store itself
+# is held (not its id()) so a new store can never be mistaken for a cleared one.
+_bm25_cache = {"store": None, "ntotal": None, "retriever": None}
+
+def get_parent_documents(documents):
+    """
+    Map retrieved child chunks to their parent chunks, keeping rank order.
+    
+    Args:
+        documents (list): Retrieved child chunks.
+    
+    Returns:
+        list: Unique parent chunks (or the child itself if its parent is unknown).
+    """
+    parents = []
+    seen = set()
+    for doc in documents:
+        parent_id = doc.metadata.get("parent_id")
+        if parent_id not in PARENT_DOCUMENTS:
+            parents.append(doc)
+        elif parent_id not in seen:
+            seen.add(parent_id)
+            parents.append(PARENT_DOCUMENTS[parent_id])
+    return parents
+
+def retrieve_docs_batch(queries, vector_store, k=5):
+    """
+    Perform semantic search for several queries with one embedding request
+    and one FAISS search over the whole query matrix.
+    
+    Args:
+        queries (list): The queries to search for.
+        vector_store: FAISS vector store instance.
+        k (int): Number of chunks to retrieve per query.
+    
+    Returns:
+        list: One list of relevant documents per query.
+    """
+    if vector_store is None:
+        logger.warning("Vector store is None - no documents indexed")
+        return [[] for _ in queries]
+    # Query embeddings go straight to the model; only document embeddings are cached
+    xq = np.asarray(
+        EMBEDDINGS.underlying_embeddings.embed_documents(queries, task_type="retrieval_query"),
+        dtype=np.float32
+    )
+    # Indexed vectors are unit length; normalizing queries makes scores cosine similarities
+    faiss.normalize_L2(xq)
+    _, indices = vector_store.index.search(xq, k)
+    results = []
+    for query, row in zip(queries, indices):
+        children = [
+            vector_store.docstore.search(vector_store.index_to_docstore_id[i])
+            for i in row if i != -1
+        ]
+        docs = get_parent_documents(children)
+        logger.info(f"Retrieved {len(docs)} documents for query: {query}")
+        results.append(docs)
+    return results
+
 def retrieve_docs(query, vector_store):
     """
     Perform semantic search using FAISS vector store.
@@ -21,12 +85,33 @@ def retrieve_docs(query, vector_store):
     Returns:
         list: List of relevant documents.
     """
-    if vector_store is None:
-        logger.warning("Vector store is None - no documents indexed")
-        return []
-    docs = vector_store.similarity_search(query, k=5)
-    logger.info(f"Retrieved {len(docs)} documents for query: {query}")
-    return docs
+    return retrieve_docs_batch([query], vector_store)[0]
+
+def get_bm25_retriever(vector_store):
+    """
+    Return a BM25 retriever over the vector store's documents, rebuilding it
+    only when the store is replaced or new chunks have been indexed.
+    
+    Args:
+        vector_store: FAISS vector store instance.
+    
+    Returns:
+        BM25Retriever: Cached retriever for the store.
+    """
+    ntotal = vector_store.index.ntotal
+    if _bm25_cache["store"] is not vector_store or _bm25_cache["ntotal"] != ntotal:
+        retriever = BM25Retriever.from_documents(
+            [Document(page_content=doc.page_content, metadata=doc.metadata)
+             for doc in vector_store.docstore._dict.values()]
+        )
+        retriever.k = 2
+        _bm25_cache.update(store=vector_store, ntotal=ntotal, retriever=retriever)
+        logger.info(f"Rebuilt BM25 index over {ntotal} chunks")
+    return _bm25_cache["retriever"]
+
+def reset_bm25_cache():
+    """Drop the cached BM25 retriever (and the store it references) after documents are cleared."""
+    _bm25_cache.update(store=None, ntotal=None, retriever=None)
 
 def hybrid_retrieval(query, vector_store):
     """
@@ -42,16 +127,12 @@ def hybrid_retrieval(query, vector_store):
     if vector_store is None:
         logger.warning("Vector store is None - no documents indexed")
         return []
-    bm25_retriever = BM25Retriever.from_documents(
-        [Document(page_content=doc.page_content, metadata=doc.metadata)
-         for doc in vector_store.docstore._dict.values()]
-    )
-    bm25_retriever.k = 2
+    bm25_retriever = get_bm25_retriever(vector_store)
     faiss_retriever = vector_store.as_retriever(search_kwargs={"k": 3})
     ensemble_retriever = EnsembleRetriever(
         retrievers=[bm25_retriever, faiss_retriever],
         weights=[0.4, 0.6]
     )
-    docs = ensemble_retriever.get_relevant_documents(query)
+    docs = get_parent_documents(ensemble_retriever.get_relevant_documents(query))
     logger.info(f"Hybrid retrieved {len(docs)} documents for query: {query}")
     return docs
\ No newline at end of file
@@ -3,7 +3,7 @@
 # including documents, messages, conversation responses, query inputs, and URL scraping requests.
 
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Literal, Optional
 
 class Document(BaseModel):
     content: str
@@ -21,6 +21,8 @@ class QueryRequest(BaseModel):
     question: str
     user_id: str
     search_mode: str = "Semantic"
+    mode: Literal["qa", "summarize", "translate"] = "qa"
+    target_language: Optional[str] = None
 
 class ScrapeUrlRequest(BaseModel):
     url: str
\ No newline at end of file
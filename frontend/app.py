@@ -4,6 +4,7 @@
 
 import streamlit as st
 import requests
+import json
 import logging
 
 # Configure logging
@@ -21,6 +22,28 @@ st.set_page_config(page_title="Conversational AI with LangChain", layout="wide",
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
+# Map a chat input to the backend query mode: "summarize" or "translate: <language>"
+def build_query_payload(user_query):
+    payload = {"question": user_query, "user_id": USER_ID, "search_mode": search_mode}
+    query = user_query.strip().lower()
+    if query == "summarize":
+        payload["mode"] = "summarize"
+    elif query.startswith("translate:"):
+        payload["mode"] = "translate"
+        payload["target_language"] = user_query.strip().split(":", 1)[1].strip() or None
+    return payload
+
+# Parse a server-sent event stream into (event, payload) pairs; the backend sends
+# one JSON-encoded "data:" line per event
+def iter_sse_events(response):
+    event = "message"
+    for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+        if line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            yield event, json.loads(line[len("data:"):])
+            event = "message"
+
 # Function to fetch conversation history
 def fetch_conversation_history():
     """Fetch conversation history from the backend without generating a response."""
@@ -130,37 +153,38 @@ if user_query := st.chat_input("Ask a question about your documents..."):
     # Append user message immediately
     st.session_state.messages.append({"role": "user", "content": user_query, "source_documents": []})
 
-    # Send query to backend
-    with st.spinner("Processing..."):
+    # Stream the answer from the backend, rendering it as tokens arrive
+    with st.chat_message("assistant"):
+        placeholder = st.empty()
+        answer = ""
+        source_documents = []
+        completed = False
         try:
-            response = requests.post(
-                f"{API_BASE_URL}/query",
-                json={"question": user_query, "user_id": USER_ID, "search_mode": search_mode}
-            )
-            response.raise_for_status()
-            data = response.json()
-            messages = data.get("messages", [])
-            # Update session state with messages in chronological order
-            st.session_state.messages = [
-                {
-                    "role": msg["role"],
-                    "content": msg["content"],
-                    "source_documents": msg.get("source_documents", [])
-                }
-                for msg in reversed(messages)  # Reverse to show oldest first
-            ]
-            logger.info(f"Updated messages: {[m['content'][:50] for m in st.session_state.messages]}")
-            # Display the latest assistant response
-            if messages and messages[0]["role"] == "assistant":  # Backend returns desc, so first is newest
-                with st.chat_message("assistant"):
-                    st.markdown(messages[0]["content"])
-                    if messages[0].get("source_documents"):
-                        with st.expander("📚 Source Documents"):
-                            for i, doc in enumerate(messages[0]["source_documents"], 1):
-                                st.markdown(f"**Document {i}**")
-                                st.caption(f"Source: {doc['metadata'].get('source', 'Unknown')}")
-                                st.text(doc["content"] + "...")
-                                st.markdown("---")
+            with requests.post(f"{API_BASE_URL}/query_stream", json=build_query_payload(user_query), stream=True) as response:
+                response.raise_for_status()
+                for event, data in iter_sse_events(response):
+                    if event == "sources":
+                        source_documents = data
+                    elif event == "error":
+                        raise requests.exceptions.RequestException(data)
+                    elif event == "done":
+                        completed = True
+                    elif event == "message":
+                        answer += data
+                        placeholder.markdown(answer + "▌")
+            placeholder.markdown(answer)
+            if not completed:
+                # The stream ended early (e.g. the backend went away); don't keep a partial answer
+                raise requests.exceptions.RequestException("Response stream ended before the answer was complete")
+            if source_documents:
+                with st.expander("📚 Source Documents"):
+                    for i, doc in enumerate(source_documents, 1):
+                        st.markdown(f"**Document {i}**")
+                        st.caption(f"Source: {doc['metadata'].get('source', 'Unknown')}")
+                        st.text(doc["content"] + "...")
+                        st.markdown("---")
+            st.session_state.messages.append({"role": "assistant", "content": answer, "source_documents": source_documents})
+            logger.info(f"Streamed answer: {answer[:50]}")
         except requests.exceptions.RequestException as e:
             logger.error(f"Query failed: {e}")
             st.error(f"Failed to process query: {e}")
\ No newline at end of file